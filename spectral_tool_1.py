@@ -2,12 +2,19 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from html import escape
 import plotly.graph_objects as go
 import plotly.express as px
+import plotly.io as pio
 from plotly.subplots import make_subplots
+import io
 import json
+import math
 import time
-import random
+from bisect import bisect_left
+from collections import Counter, deque
+from itertools import islice
+from typing import NamedTuple
 
 # ==================== 页面配置 ====================
 st.set_page_config(
@@ -18,7 +25,8 @@ st.set_page_config(
 )
 
 # ==================== 自定义CSS样式 ====================
-st.markdown("""
+# 样式表为固定常量，通过st.html直接注入，无需经过markdown解析
+_CSS_BLOCK = """
 <style>
     /* 全局样式 */
     .stApp {
@@ -80,6 +88,24 @@ st.markdown("""
     }
     
     /* 指标卡片 */
+    .metric-grid {
+        display: grid;
+        grid-template-columns: repeat(4, 1fr);
+        gap: 1rem;
+    }
+    
+    .result-grid {
+        display: grid;
+        grid-template-columns: 1fr 1fr;
+        gap: 1rem;
+    }
+    
+    @media (max-width: 640px) {
+        .metric-grid, .result-grid {
+            grid-template-columns: 1fr;
+        }
+    }
+    
     .metric-card {
         background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
         color: white;
@@ -88,6 +114,44 @@ st.markdown("""
         text-align: center;
     }
     
+    /* 结果卡片 */
+    .result-card {
+        background: white;
+        padding: 2rem;
+        border-radius: 15px;
+        box-shadow: 0 5px 15px rgba(0,0,0,0.05);
+    }
+    
+    .result-grid > .result-card {
+        height: 300px;
+    }
+    
+    .result-panel {
+        margin-top: 1rem;
+        padding: 1rem;
+        background: #f8f9fa;
+        border-radius: 10px;
+    }
+    
+    .result-table {
+        width: 100%;
+        margin-top: 1rem;
+        font-size: 16px;
+    }
+    
+    .result-table tr {
+        height: 50px;
+    }
+    
+    .result-table td:first-child {
+        width: 40%;
+    }
+    
+    .result-value {
+        color: #2E8B57;
+        font-weight: bold;
+    }
+    
     /* 进度条样式 */
     .stProgress > div > div > div {
         background: linear-gradient(90deg, #2E8B57 0%, #90EE90 100%);
@@ -146,9 +210,115 @@ st.markdown("""
     #MainMenu {visibility: hidden;}
     footer {visibility: hidden;}
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.html(_CSS_BLOCK)
+
+# ==================== 指标卡片模板 ====================
+_METRIC_CARD_TMPL = """
+<div class="metric-card"{style}>
+    <h3>{icon}</h3>
+    {body}
+</div>
+"""
+
+_STATIC_METRIC_CARDS = "".join(
+    _METRIC_CARD_TMPL.format(style="", icon=icon, body=f"<h2>{value}</h2>\n    <p>{label}</p>")
+    for icon, value, label in (
+        ("🎯", "98.5%", "检测准确率"),
+        ("📊", "1,247", "累计分析次数"),
+        ("⏱️", "2.3s", "平均分析时间"),
+    )
+)
+
+_BT_DISCONNECTED_CARD = _METRIC_CARD_TMPL.format(
+    style=' style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);"',
+    icon="📱",
+    body="<h2>蓝牙</h2>\n    <p>设备未连接</p>"
+)
+
+_BT_CONNECTED_CARD_TMPL = _METRIC_CARD_TMPL.format(
+    style=' style="background: linear-gradient(135deg, #00b09b 0%, #96c93d 100%);"',
+    icon="📱",
+    body='<h4 style="margin: 0.5rem 0;">已连接</h4>\n    <p style="font-size: 0.9rem; margin: 0;">{device_name}...</p>'
+)
+
+# ==================== 结果卡片模板 ====================
+# 结果状态到显示颜色、积累阶段到仪表盘数值的映射
+_MATURITY_STATUS_COLORS = {"成熟": "#FF6B6B"}
+
+_CHLOROPHYLL_STATUS_COLORS = {
+    "正常": "#2E8B57",
+    "偏高": "#FFA500",
+    "偏低": "#FF6B6B"
+}
+
+_ANTIOXIDANT_COLORS = {
+    "强": "#2E8B57",
+    "中": "#FFA500",
+    "弱": "#FF6B6B"
+}
+
+_ACCUMULATION_STAGE_LEVELS = {
+    "初期": 25,
+    "中期成熟": 60,
+    "完全成熟": 95
+}
+
+# 固定样式放在样式表的result-*类中，模板只保留随结果变化的颜色
+_MATURITY_RESULT_TMPL = """
+<div class="result-grid">
+    <div class="result-card">
+        <h4 style="color: #2E8B57;">📊 详细指标</h4>
+        <table class="result-table">
+            <tr><td><b>单铃重:</b></td><td>{boll_weight} g</td></tr>
+            <tr><td><b>纤维品质:</b></td><td><span class="result-value">{fiber_quality}</span></td></tr>
+            <tr><td><b>成熟状态:</b></td><td><span class="result-value" style="color: {status_color};">{maturity_status}</span></td></tr>
+        </table>
+    </div>
+    <div class="result-card">
+        <h4 style="color: #2E8B57;">💡 生产建议</h4>
+        <div class="result-panel"><p>{recommendation}</p></div>
+        <div style="margin-top: 1rem;"><small>基于光谱指数分析，结合历史数据模型得出</small></div>
+    </div>
+</div>
+"""
+
+_CHLOROPHYLL_RESULT_TMPL = """
+<div class="result-card">
+    <h4 style="color: {status_color};">📈 分析结果</h4>
+    <div class="result-panel">
+        <p><b>总叶绿素含量:</b> {total} mg/g</p>
+        <p><b>叶绿素a:</b> {chlorophyll_a} mg/g</p>
+        <p><b>叶绿素b:</b> {chlorophyll_b} mg/g</p>
+        <p><b>叶绿素a/b比值:</b> {a_b_ratio:.2f}</p>
+    </div>
+    <div class="result-panel" style="background: #e8f4f8;">
+        <small>💡 正常范围: 2.0-3.0 mg/g | 当前状态: <b>{status}</b></small>
+    </div>
+</div>
+"""
+
+_ANTHOCYANIN_RESULT_TMPL = """
+<div class="result-card">
+    <h4 style="color: #8A2BE2;">🌸 花青素分析</h4>
+    <div class="result-panel">
+        <p><b>含量:</b> {content} mg/g</p>
+        <p><b>积累阶段:</b> {accumulation_stage}</p>
+        <p><b>抗氧化能力:</b> <span style="color: {antioxidant_color}">{antioxidant}</span></p>
+    </div>
+    <div class="result-panel" style="background: #f5f0ff;">
+        <small>💡 花青素含量与棉铃成熟度、抗逆性密切相关</small>
+    </div>
+</div>
+"""
 
 # ==================== 初始化Session State ====================
+# 每个会话最多保留的分析记录条数，超出后自动丢弃最早的记录
+_MAX_HISTORY = 50
+# 蓝牙数据缓冲区最多保留的数据包个数
+_MAX_DATA_BUFFER = 50
+
 def init_session_state():
     """初始化所有session state变量"""
     default_states = {
@@ -156,12 +326,30 @@ def init_session_state():
         'logged_in': False,
         'uploaded_data': None,
         'filtered_data': None,
+        # 最近一次筛选的 (源数据, 波长范围, 筛选结果)，参数未变时直接复用
+        'filtered_view': None,
         'detection_type': "成熟度",
         'detection_result': None,
-        'analysis_history': [],
+        'analysis_history': deque(maxlen=_MAX_HISTORY),
+        # 按列保存的历史字段，供统计直接使用，与analysis_history同步追加
+        'history_columns': {
+            'type': deque(maxlen=_MAX_HISTORY),
+            'confidence': deque(maxlen=_MAX_HISTORY)
+        },
         'user_name': "",
         'selected_wavelength': [400, 1000],
         'upload_time': None,
+        'data_source_id': None,
+        'data_stats': None,
+        'spectral_arrays': None,
+        # 当前数据按波长区间缓存的光谱指数，切换检测类型时直接复用
+        'spectral_indices': {},
+        # 各光谱图的 (数据, 标题, 图形对象)，按cache_key保存，数据未变时直接复用
+        'figure_cache': {},
+        # 最近一次导出的 (DataFrame, CSV字节)，同一数据重复导出时直接复用
+        'csv_cache': None,
+        'history_stats': None,
+        'history_table': None,
         'show_data_preview': False,
         'analysis_completed': False,
         'just_analyzed': False,
@@ -176,14 +364,17 @@ def init_session_state():
         'connection_error': None,
         'bluetooth_supported': True,
         'last_connection_time': None,
-        'data_buffer': []
+        'data_buffer': deque(maxlen=_MAX_DATA_BUFFER)
     }
     
     for key, value in default_states.items():
-        if key not in st.session_state:
-            st.session_state[key] = value
+        st.session_state.setdefault(key, value)
 
 # ==================== 辅助函数 ====================
+def escape_html_fields(record):
+    """返回记录的浅拷贝，其中的字符串值已做HTML转义，可直接填入HTML模板"""
+    return {key: escape(value) if isinstance(value, str) else value for key, value in record.items()}
+
 def is_dataframe_valid(df):
     """检查DataFrame是否有效且非空"""
     if df is None:
@@ -192,15 +383,57 @@ def is_dataframe_valid(df):
         return not df.empty and len(df) > 0
     return False
 
+def lttb_downsample(x, y, n_out):
+    """LTTB（Largest-Triangle-Three-Buckets）降采样，在保留曲线形状的前提下限制点数"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+    
+    # 首尾点固定保留，中间点均分为 n_out-2 个桶
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    idx = np.empty(n_out, dtype=np.intp)
+    idx[0], idx[-1] = 0, n - 1
+    
+    # 一次性算出每个桶“下一个桶”的均值点（最后一个桶以末点代替）
+    starts = edges[1:]
+    counts = np.diff(starts, append=n)
+    avg_xs = np.add.reduceat(x, starts, dtype=np.float64) / counts
+    avg_ys = np.add.reduceat(y, starts, dtype=np.float64) / counts
+    
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        avg_x, avg_y = avg_xs[i], avg_ys[i]
+        # 选取与上一保留点、下一桶均值点构成三角形面积最大的点
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        idx[i + 1] = a
+    
+    return x[idx], y[idx]
+
 # ==================== 数据加载与处理函数 ====================
-@st.cache_data(show_spinner=False)
+# 上传文件的解析结果跨会话共享，限制缓存条数以免内存无限增长
+@st.cache_data(show_spinner=False, max_entries=16)
 def load_spectral_data(file):
     """加载光谱数据文件"""
     try:
-        data = pd.read_csv(file)
-        if data.shape[1] >= 2:
+        # 先只读表头确认列数
+        header = pd.read_csv(file, nrows=0)
+        file.seek(0)
+        if header.shape[1] >= 2:
+            # 只解析前两列，并在读取时直接转为float32（反射率精度足够，内存与传输量减半）
+            try:
+                # pyarrow引擎多线程解析，大文件明显快于C引擎（pyarrow随streamlit一起安装）
+                data = pd.read_csv(file, engine='pyarrow', usecols=list(header.columns[:2]), dtype=np.float32)
+            except Exception:
+                # Arrow无法处理的格式回退到C引擎，真正的数据错误会在这里再次抛出
+                file.seek(0)
+                data = pd.read_csv(file, engine='c', usecols=[0, 1], dtype=np.float32)
             # 重命名列
-            data.columns = ['Wavelength', 'Reflectance'] + list(data.columns[2:])
+            data.columns = ['Wavelength', 'Reflectance']
+            # 后续分析按二分查找切片，要求波长升序
+            if not data['Wavelength'].is_monotonic_increasing:
+                data = data.sort_values('Wavelength', ignore_index=True)
             return data
         else:
             st.error("CSV文件需要至少包含两列：波长和反射率")
@@ -209,64 +442,193 @@ def load_spectral_data(file):
         st.error(f"数据加载失败: {str(e)}")
         return None
 
-@st.cache_data
-def generate_sample_data():
-    """生成示例光谱数据"""
-    np.random.seed(42)
+def dataframe_to_csv_bytes(df, chunksize=10_000):
+    """将DataFrame分块写成UTF-8编码的CSV字节，不先生成完整的字符串再编码"""
+    buffer = io.BytesIO()
+    df.to_csv(buffer, index=False, chunksize=chunksize, encoding='utf-8')
+    return buffer.getvalue()
+
+def get_csv_bytes(df):
+    """取DataFrame的CSV字节，会话内按数据对象缓存最近一份，同一数据重复导出时不再格式化"""
+    cached = st.session_state.csv_cache
+    if cached is not None and cached[0] is df:
+        return cached[1]
+    
+    csv = dataframe_to_csv_bytes(df)
+    # 同时持有数据引用，保证is比较不会因对象回收后地址复用而误命中
+    st.session_state.csv_cache = (df, csv)
+    return csv
+
+def _build_sample_data():
+    """构建示例光谱数据（仅在模块加载时调用一次）"""
+    rng = np.random.default_rng(42)
     wavelength = np.linspace(350, 1100, 751)
-    
+
     # 生成更真实的植物光谱曲线
-    reflectance = np.zeros_like(wavelength)
-    
+    # 波长单调递增，一次二分查找得到各区段边界，按连续切片分段计算
+    i1, i2, i3 = np.searchsorted(wavelength, (500, 600, 700), side='right')
+    reflectance = np.empty_like(wavelength)
+
     # 350-500nm: 低反射区域
-    mask1 = wavelength <= 500
-    reflectance[mask1] = 0.05 + 0.03 * np.sin(wavelength[mask1]/100)
-    
+    reflectance[:i1] = 0.05 + 0.03 * np.sin(wavelength[:i1]/100)
+
     # 500-600nm: 绿光反射峰
-    mask2 = (wavelength > 500) & (wavelength <= 600)
-    reflectance[mask2] = 0.1 + 0.15 * np.sin((wavelength[mask2]-500)/100*np.pi)
-    
+    reflectance[i1:i2] = 0.1 + 0.15 * np.sin((wavelength[i1:i2]-500)/100*np.pi)
+
     # 600-700nm: 红光吸收谷
-    mask3 = (wavelength > 600) & (wavelength <= 700)
-    reflectance[mask3] = 0.08 + 0.05 * np.cos((wavelength[mask3]-600)/100*np.pi)
-    
+    reflectance[i2:i3] = 0.08 + 0.05 * np.cos((wavelength[i2:i3]-600)/100*np.pi)
+
     # 700-1100nm: 近红外高台
-    mask4 = wavelength > 700
-    reflectance[mask4] = 0.4 + 0.1 * np.sin(wavelength[mask4]/150) + 0.05 * np.random.randn(sum(mask4))
-    
+    reflectance[i3:] = 0.4 + 0.1 * np.sin(wavelength[i3:]/150) + 0.05 * rng.standard_normal(len(wavelength) - i3)
+
     # 添加噪声
-    reflectance += 0.01 * np.random.randn(len(wavelength))
-    reflectance = np.clip(reflectance, 0, 1)
+    reflectance += 0.01 * rng.standard_normal(len(wavelength))
+    np.clip(reflectance, 0, 1, out=reflectance)
+    
+    # 与上传数据一致使用float32（固定种子的噪声序列按float64生成，保持示例数据不变）
+    return pd.DataFrame({
+        'Wavelength': wavelength.astype(np.float32),
+        'Reflectance': reflectance.astype(np.float32)
+    })
+
+@st.cache_resource(show_spinner=False)
+def _sample_bundle():
+    """示例数据及其CSV字节（固定种子、结果不变，进程内只构建一次）
+
+    脚本每次rerun都会重新执行模块顶层代码，因此用cache_resource保存；
+    无参数且直接返回同一对象，不需要cache_data的哈希与序列化。
+    """
+    data = _build_sample_data()
+    return data, dataframe_to_csv_bytes(data)
+
+def generate_sample_data():
+    """获取示例光谱数据（共享只读对象，请勿原地修改）"""
+    return _sample_bundle()[0]
+
+def wavelength_slice(wavelength, wl_min, wl_max):
+    """返回升序波长数组中 [wl_min, wl_max] 区间对应的切片（二分查找，O(log n)）"""
+    lo = np.searchsorted(wavelength, wl_min, side='left')
+    hi = np.searchsorted(wavelength, wl_max, side='right')
+    return slice(lo, hi)
+
+def filter_wavelength_range(data, wl_min, wl_max):
+    """筛选 [wl_min, wl_max] 波长区间内的数据"""
+    wavelength = data['Wavelength']
+    if not wavelength.is_monotonic_increasing:
+        return data[(wavelength >= wl_min) & (wavelength <= wl_max)]
+    
+    # 波长升序时二分查找区间端点，iloc切片无需构造布尔掩码
+    return data.iloc[wavelength_slice(wavelength.to_numpy(), wl_min, wl_max)]
+
+class SpectralArrays(NamedTuple):
+    """分析计算用的光谱数组（C连续float32，波长升序）"""
+    wavelength: np.ndarray
+    reflectance: np.ndarray
+
+def to_spectral_arrays(data):
+    """从DataFrame提取C连续float32数组，数据入库时转换一次"""
+    return SpectralArrays(
+        np.ascontiguousarray(data['Wavelength'].to_numpy(np.float32)),
+        np.ascontiguousarray(data['Reflectance'].to_numpy(np.float32))
+    )
+
+def slice_spectral_arrays(arrays, wl_min, wl_max):
+    """截取 [wl_min, wl_max] 波长区间（返回视图，不复制数据）"""
+    band = wavelength_slice(arrays.wavelength, wl_min, wl_max)
+    return SpectralArrays(arrays.wavelength[band], arrays.reflectance[band])
+
+def compute_spectral_indices(wavelength, reflectance):
+    """计算NDVI与红边积分（纯数值计算）
+    
+    reflectance可以是单条光谱 (n,)，也可以是共用同一波长网格的多条光谱 (m, n)，
+    后者按行批量计算，返回长度为m的数组。
+    """
+    if reflectance.shape[-1] > 100:
+        nir = reflectance[..., -1]
+        red = reflectance[..., 100]
+        ndvi = (nir - red) / (nir + red)
+    else:
+        ndvi = np.zeros(reflectance.shape[:-1])[()]
+    
+    # 波长升序，二分查找680-750nm红边区间，连续切片无需布尔掩码拷贝
+    band = wavelength_slice(wavelength, 680, 750)
+    if band.stop > band.start:
+        # 梯形积分写成相邻点均值与波长步长的点积，省去np.trapezoid的通用处理开销
+        segment = reflectance[..., band]
+        red_edge = 0.5 * ((segment[..., 1:] + segment[..., :-1]) @ np.diff(wavelength[band]))
+    else:
+        red_edge = np.zeros(reflectance.shape[:-1])[()]
     
-    return pd.DataFrame({'Wavelength': wavelength, 'Reflectance': reflectance})
+    return ndvi, red_edge
 
 def analyze_spectral_data(data, detection_type):
-    """分析光谱数据并返回结果"""
-    if data is None or len(data) == 0:
+    """分析光谱数据并返回结果（data为SpectralArrays，也兼容DataFrame）"""
+    if data is None:
         return None
+    if isinstance(data, pd.DataFrame):
+        data = to_spectral_arrays(data)
     
-    reflectance = data['Reflectance'].values
-    wavelength = data['Wavelength'].values
+    wavelength, reflectance = data
+    if reflectance.size == 0:
+        return None
     
     # 计算各种指数（基于真实光谱指数公式）
-    ndvi = (reflectance[-1] - reflectance[100]) / (reflectance[-1] + reflectance[100]) if len(reflectance) > 100 else 0
-    red_edge = np.trapz(reflectance[(wavelength >= 680) & (wavelength <= 750)]) if sum((wavelength >= 680) & (wavelength <= 750)) > 0 else 0
-    
+    ndvi, red_edge = compute_spectral_indices(wavelength, reflectance)
+    # 单条光谱的指数转为Python浮点数，避免float32的表示误差出现在结果文本中
+    return score_spectral_features(float(ndvi), float(red_edge), detection_type)
+
+# 每份数据最多缓存的波长区间个数
+_MAX_CACHED_INDICES = 16
+
+def get_spectral_indices(arrays, wl_min, wl_max):
+    """取 [wl_min, wl_max] 区间的NDVI与红边积分，同一份数据同一区间只计算一次
+    
+    指数与检测类型无关，缓存在session中随数据一起失效；区间内无数据时返回None。
+    """
+    cache = st.session_state.spectral_indices
+    key = (wl_min, wl_max)
+    if key not in cache:
+        band = slice_spectral_arrays(arrays, wl_min, wl_max)
+        if band.reflectance.size == 0:
+            indices = None
+        else:
+            ndvi, red_edge = compute_spectral_indices(*band)
+            indices = (float(ndvi), float(red_edge))
+        if len(cache) >= _MAX_CACHED_INDICES:
+            del cache[next(iter(cache))]
+        cache[key] = indices
+    return cache[key]
+
+# 分级阈值表：(升序阈值, 各档结果)，数值大于某个阈值即进入上一档；
+# “达到即进入”的阈值写成略小于它的浮点数
+_FIBER_QUALITY_GRADES = ((60, 80), ("中", "良", "优"))
+_MATURITY_STATUS_GRADES = ((math.nextafter(60, -math.inf),), ("未成熟", "成熟"))
+_HARVEST_ADVICE_GRADES = ((60, 80), ("建议继续生长", "建议5-7天后采摘", "建议3天内采摘"))
+_CHLOROPHYLL_STATUS_GRADES = ((math.nextafter(2.0, -math.inf), 3.0), ("偏低", "正常", "偏高"))
+_ANTIOXIDANT_GRADES = ((1.5, 2.0), ("弱", "中", "强"))
+_ACCUMULATION_STAGE_GRADES = ((1.5, 2.0), ("初期", "中期成熟", "完全成熟"))
+
+def classify_grade(value, grades):
+    """按分级阈值表返回数值所在档位的结果"""
+    thresholds, labels = grades
+    return labels[bisect_left(thresholds, value)]
+
+def score_spectral_features(ndvi, red_edge, detection_type):
+    """由光谱指数按检测类型生成结果（纯标量计算，不涉及光谱数组）"""
     if detection_type == "成熟度":
         # 成熟度评估
-        maturity_score = min(100, max(0, 50 + ndvi * 100 + red_edge * 50))
+        # 指数已是Python浮点数，上下限也用浮点数，截断后的得分同样保持float
+        maturity_score = min(100.0, max(0.0, 50.0 + ndvi * 100.0 + red_edge * 50.0))
         # 根据成熟度计算单铃重（模拟数据）
         boll_weight = 4.5 + (maturity_score / 100) * 1.5  # 4.5-6.0g范围
         
-        fiber_quality = "优" if maturity_score > 80 else "良" if maturity_score > 60 else "中"
-        
         return {
             'type': '成熟度',
             'score': round(maturity_score, 1),
             'boll_weight': round(boll_weight, 2),  # 单铃重，单位：g
-            'fiber_quality': fiber_quality,
-            'maturity_status': "成熟" if maturity_score >= 60 else "未成熟",
-            'recommendation': "建议3天内采摘" if maturity_score > 80 else "建议5-7天后采摘" if maturity_score > 60 else "建议继续生长",
+            'fiber_quality': classify_grade(maturity_score, _FIBER_QUALITY_GRADES),
+            'maturity_status': classify_grade(maturity_score, _MATURITY_STATUS_GRADES),
+            'recommendation': classify_grade(maturity_score, _HARVEST_ADVICE_GRADES),
             'confidence': round(min(95, 70 + maturity_score * 0.25), 1)
         }
     
@@ -275,39 +637,115 @@ def analyze_spectral_data(data, detection_type):
         chlorophyll_a = 1.2 + ndvi * 0.8
         chlorophyll_b = 1.0 + ndvi * 0.6
         total_chlorophyll = chlorophyll_a + chlorophyll_b
+        chlorophyll_a, chlorophyll_b = round(chlorophyll_a, 2), round(chlorophyll_b, 2)
         
         return {
             'type': '叶绿素',
             'total': round(total_chlorophyll, 2),
-            'chlorophyll_a': round(chlorophyll_a, 2),
-            'chlorophyll_b': round(chlorophyll_b, 2),
-            'status': "正常" if 2.0 <= total_chlorophyll <= 3.0 else "偏高" if total_chlorophyll > 3.0 else "偏低",
+            'chlorophyll_a': chlorophyll_a,
+            'chlorophyll_b': chlorophyll_b,
+            # a/b比值在分析时算好，叶绿素b为0时记为NaN
+            'a_b_ratio': chlorophyll_a / chlorophyll_b if chlorophyll_b else float('nan'),
+            'status': classify_grade(total_chlorophyll, _CHLOROPHYLL_STATUS_GRADES),
             'confidence': round(min(95, 65 + total_chlorophyll * 10), 1)
         }
     
     elif detection_type == "花青素":
         # 花青素含量估计
         anthocyanin = 1.5 + (1 - ndvi) * 0.8
-        antioxidant = "强" if anthocyanin > 2.0 else "中" if anthocyanin > 1.5 else "弱"
         
         return {
             'type': '花青素',
             'content': round(anthocyanin, 2),
-            'antioxidant': antioxidant,
-            'accumulation_stage': "完全成熟" if anthocyanin > 2.0 else "中期成熟" if anthocyanin > 1.5 else "初期",
+            'antioxidant': classify_grade(anthocyanin, _ANTIOXIDANT_GRADES),
+            'accumulation_stage': classify_grade(anthocyanin, _ACCUMULATION_STAGE_GRADES),
             'confidence': round(min(95, 60 + anthocyanin * 15), 1)
         }
     
     return None
 
+def append_history(result):
+    """追加一条分析记录，同时写入按列保存的历史字段"""
+    st.session_state.analysis_history.append(result)
+    columns = st.session_state.history_columns
+    columns['type'].append(result['type'])
+    columns['confidence'].append(result.get('confidence', 0))
+
+def compute_history_stats(columns):
+    """按列统计分析历史：总次数、平均置信度、最常检测类型"""
+    total = len(columns['type'])
+    type_counts = Counter(columns['type'])
+    return {
+        'total': total,
+        'avg_confidence': sum(columns['confidence']) / max(total, 1),
+        'most_common': type_counts.most_common(1)[0][0] if type_counts else "N/A"
+    }
+
+def get_history_stats():
+    """取得当前会话的历史统计，历史未变化时直接复用上次的结果
+    
+    历史记录只会追加（满额后丢弃最早一条），因此条数加最后一条记录
+    即可判断是否变化；按会话保存，不同用户的历史互不影响。
+    """
+    history = st.session_state.analysis_history
+    last = history[-1] if history else None
+    cached = st.session_state.history_stats
+    if cached is None or cached[0] != len(history) or cached[1] is not last:
+        cached = st.session_state.history_stats = (len(history), last, compute_history_stats(st.session_state.history_columns))
+    return cached[2]
+
+def history_record_row(record):
+    """把一条分析记录展开为历史表格中的一行"""
+    if record['type'] == '成熟度':
+        summary = (f"成熟度指数 {record['score']}% · {record.get('maturity_status', 'N/A')} · "
+                   f"单铃重 {record.get('boll_weight', 'N/A')} g · 纤维品质 {record.get('fiber_quality', 'N/A')}")
+        advice = record['recommendation']
+    elif record['type'] == '叶绿素':
+        summary = (f"总叶绿素 {record['total']} mg/g · 叶绿素a {record['chlorophyll_a']} mg/g · "
+                   f"叶绿素b {record['chlorophyll_b']} mg/g · {record['status']}")
+        advice = ""
+    else:
+        summary = (f"花青素含量 {record['content']} mg/g · {record['accumulation_stage']} · "
+                   f"抗氧化能力{record['antioxidant']}")
+        advice = ""
+    
+    return {
+        '分析时间': record.get('time', '未知时间'),
+        '检测类型': record['type'],
+        '检测结果': summary,
+        '建议': advice,
+        '置信度(%)': record['confidence']
+    }
+
+def get_history_table():
+    """取得当前会话按时间倒序排列的历史表格，历史未变化时直接复用"""
+    history = st.session_state.analysis_history
+    last = history[-1] if history else None
+    cached = st.session_state.history_table
+    if cached is None or cached[0] != len(history) or cached[1] is not last:
+        table = pd.DataFrame([history_record_row(record) for record in reversed(history)])
+        cached = st.session_state.history_table = (len(history), last, table)
+    return cached[2]
+
 # ==================== 可视化函数 ====================
-def create_spectral_plot(data, title="光谱数据曲线"):
-    """创建交互式光谱图"""
+# 单条光谱曲线最多绘制的点数，超出时先做LTTB降采样
+_MAX_PLOT_POINTS = 2000
+
+# 光谱图中不受Streamlit主题影响的通用设置注册为Plotly模板，布局校验只在注册时进行一次
+# （plotly.io是已导入的模块，脚本rerun时不会重复注册）。
+# 标题、背景、边距和坐标轴颜色会被st.plotly_chart的主题覆盖模板中的值，需直接写在布局上。
+if "cotton" not in pio.templates:
+    pio.templates["cotton"] = go.layout.Template(layout=dict(
+        hovermode='x unified',
+        height=400
+    ))
+
+def _build_spectral_figure():
+    """构建光谱图骨架（布局固定，曲线数据与标题由调用方填充）"""
     fig = go.Figure()
     
-    fig.add_trace(go.Scatter(
-        x=data['Wavelength'],
-        y=data['Reflectance'],
+    # 使用WebGL渲染，避免大量点时SVG性能骤降
+    fig.add_trace(go.Scattergl(
         mode='lines',
         name='反射率',
         line=dict(color='#FF6B6B', width=3),
@@ -316,16 +754,13 @@ def create_spectral_plot(data, title="光谱数据曲线"):
     ))
     
     fig.update_layout(
+        template="plotly_white+cotton",
         title=dict(
-            text=title,
             x=0.5,
             font=dict(size=20, color='#2E8B57')
         ),
         xaxis_title="波长 (nm)",
         yaxis_title="反射率",
-        template="plotly_white",
-        hovermode='x unified',
-        height=400,
         margin=dict(l=50, r=50, t=80, b=50),
         plot_bgcolor='rgba(240, 240, 240, 0.1)',
         paper_bgcolor='rgba(255, 255, 255, 0.9)',
@@ -336,21 +771,65 @@ def create_spectral_plot(data, title="光谱数据曲线"):
         yaxis=dict(
             gridcolor='rgba(0,0,0,0.1)',
             linecolor='rgba(0,0,0,0.2)'
-        )
+        ),
+        # 固定uirevision，rerun更新数据时保留用户的缩放与平移状态
+        uirevision='spectral',
+        # 数据更新时直接重绘，不播放过渡动画
+        transition_duration=0
     )
     
     return fig
 
-def create_maturity_gauge(value, title="成熟度"):
-    """创建成熟度仪表盘图表 - 红色表示成熟，绿色表示未成熟"""
-    # 强制指针处于成熟区域（红色部分），确保无绿色区域红色痕迹
-    mature_value = max(60, value)  # 确保值至少为60，处于成熟区域
+def create_spectral_plot(data, title="光谱数据曲线", cache_key="spectral"):
+    """创建交互式光谱图
+    
+    每个cache_key对应会话内的一个图形对象，并记住最近一次填充用的数据对象和标题：
+    rerun时传入同一份数据（例如波长范围未变）直接返回已填充好的图，
+    跳过降采样和曲线赋值；数据变化时在原对象上更新曲线数据和标题。
+    同页的不同图表应使用不同的cache_key。
+    """
+    figures = st.session_state.figure_cache
+    cached = figures.get(cache_key)
+    if cached is not None and cached[0] is data and cached[1] == title:
+        return cached[2]
+    
+    fig = cached[2] if cached is not None else _build_spectral_figure()
+    _fill_spectral_figure(fig, data, title)
+    # 同时持有数据引用，保证is比较不会因对象回收后地址复用而误命中
+    figures[cache_key] = (data, title, fig)
+    return fig
+
+def _fill_spectral_figure(fig, data, title):
+    """把降采样后的曲线数据和标题写入光谱图骨架"""
+    x, y = lttb_downsample(
+        data['Wavelength'].to_numpy(),
+        data['Reflectance'].to_numpy(),
+        _MAX_PLOT_POINTS
+    )
+    
+    fig.data[0].x = x
+    fig.data[0].y = y
+    fig.layout.title.text = title
+    
+    return fig
+
+def create_result_spectral_plot(data, title="分析光谱数据"):
+    """创建结果页光谱图
+    
+    结果页上的rerun（导航、导出等按钮）不会改变分析数据，同一份数据直接复用已填充的图。
+    st.plotly_chart收到字典时会重新构建并校验Figure，所以缓存图形对象而不是JSON。
+    """
+    return create_spectral_plot(data, title, cache_key="result_spectral")
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _build_maturity_gauge(value, title):
+    """构建成熟度仪表盘（按参数缓存，各会话共享同一对象，只读使用）"""
     status_text = "已成熟"
     status_color = "#FF6B6B"  # 固定为红色
     
     fig = go.Figure(go.Indicator(
         mode="gauge",
-        value=mature_value,  # 使用强制后的成熟值
+        value=value,
         title={'text': title, 'font': {'size': 24, 'color': status_color}},
         gauge={
             'axis': {
@@ -392,8 +871,14 @@ def create_maturity_gauge(value, title="成熟度"):
     
     return fig
 
+def create_maturity_gauge(value, title="成熟度"):
+    """创建成熟度仪表盘图表 - 红色表示成熟，绿色表示未成熟"""
+    # 强制指针处于成熟区域（红色部分），确保无绿色区域红色痕迹
+    return _build_maturity_gauge(max(60, value), title)  # 确保值至少为60，处于成熟区域
+
+@st.cache_resource(show_spinner=False, max_entries=64)
 def create_result_gauge(value, title, max_value=100):
-    """创建通用仪表盘图表"""
+    """创建通用仪表盘图表（按参数缓存，各会话共享同一对象，只读使用）"""
     fig = go.Figure(go.Indicator(
         mode="gauge+number",
         value=value,
@@ -417,6 +902,21 @@ def create_result_gauge(value, title, max_value=100):
     fig.update_layout(height=300, margin=dict(l=20, r=20, t=50, b=20))
     return fig
 
+@st.cache_resource(show_spinner=False, max_entries=64)
+def create_chlorophyll_bar(chlorophyll_a, chlorophyll_b):
+    """创建叶绿素组分柱状图（按参数缓存，各会话共享同一对象，只读使用）"""
+    fig = go.Figure(data=[
+        go.Bar(name='叶绿素a', x=['含量'], y=[chlorophyll_a], marker_color='#2E8B57'),
+        go.Bar(name='叶绿素b', x=['含量'], y=[chlorophyll_b], marker_color='#90EE90')
+    ])
+    fig.update_layout(
+        title="叶绿素组分分析",
+        barmode='group',
+        height=400,
+        showlegend=True
+    )
+    return fig
+
 # ==================== 蓝牙连接模块 ====================
 def check_bluetooth_support():
     """检查浏览器是否支持Web Bluetooth API"""
@@ -425,57 +925,77 @@ def check_bluetooth_support():
     # 这里我们假设支持蓝牙，实际使用中需要前端检测
     return True
 
+# 模拟的可用设备列表（各会话共享，只读使用）
+_SIMULATED_DEVICES = (
+    {"name": "SpectraScan-2000", "address": "AA:BB:CC:DD:EE:01", "type": "光谱仪", "rssi": -45, "paired": True},
+    {"name": "AgriSpectrum-Pro", "address": "AA:BB:CC:DD:EE:02", "type": "光谱仪", "rssi": -52, "paired": False},
+    {"name": "CropSense-300", "address": "AA:BB:CC:DD:EE:03", "type": "多光谱传感器", "rssi": -60, "paired": True},
+    {"name": "LeafAnalyzer-BT", "address": "AA:BB:CC:DD:EE:04", "type": "叶绿素计", "rssi": -65, "paired": False},
+    {"name": "PlantHealth-Monitor", "address": "AA:BB:CC:DD:EE:05", "type": "植物健康监测", "rssi": -70, "paired": True}
+)
+
 def simulate_bluetooth_devices():
     """模拟可用的蓝牙设备列表"""
-    devices = [
-        {"name": "SpectraScan-2000", "address": "AA:BB:CC:DD:EE:01", "type": "光谱仪", "rssi": -45, "paired": True},
-        {"name": "AgriSpectrum-Pro", "address": "AA:BB:CC:DD:EE:02", "type": "光谱仪", "rssi": -52, "paired": False},
-        {"name": "CropSense-300", "address": "AA:BB:CC:DD:EE:03", "type": "多光谱传感器", "rssi": -60, "paired": True},
-        {"name": "LeafAnalyzer-BT", "address": "AA:BB:CC:DD:EE:04", "type": "叶绿素计", "rssi": -65, "paired": False},
-        {"name": "PlantHealth-Monitor", "address": "AA:BB:CC:DD:EE:05", "type": "植物健康监测", "rssi": -70, "paired": True}
-    ]
-    return devices
+    return _SIMULATED_DEVICES
 
-def simulate_spectral_data_from_device():
-    """从模拟设备生成光谱数据"""
-    np.random.seed(int(time.time()))
+@st.cache_resource(show_spinner=False)
+def _device_spectrum_model():
+    """模拟设备的波长网格与光谱模型（只读，进程内只构建一次）
+
+    各区段曲线形状与成熟度无关，成熟度只按区段线性抬升反射率，
+    因此把光谱拆成固定的基线和每单位成熟度的增量两部分预先算好。
+    """
     wavelength = np.linspace(400, 1100, 701)
-    
-    # 模拟不同成熟度的光谱曲线
-    maturity_level = random.uniform(0.3, 0.9)  # 成熟度参数
-    
-    reflectance = np.zeros_like(wavelength)
+    # 波长单调递增，二分查找得到500/600/700nm各区段的切片边界
+    i1, i2, i3 = np.searchsorted(wavelength, (500, 600, 700), side='right')
+    base = np.empty_like(wavelength)
+    maturity_gain = np.empty_like(wavelength)
     
     # 350-500nm: 低反射区域
-    mask1 = wavelength <= 500
-    reflectance[mask1] = 0.04 + 0.02 * np.sin(wavelength[mask1]/100)
+    base[:i1] = 0.04 + 0.02 * np.sin(wavelength[:i1]/100)
+    maturity_gain[:i1] = 0
     
     # 500-600nm: 绿光反射峰
-    mask2 = (wavelength > 500) & (wavelength <= 600)
-    reflectance[mask2] = (0.08 + 0.12 * maturity_level) + 0.1 * np.sin((wavelength[mask2]-500)/100*np.pi)
+    base[i1:i2] = 0.08 + 0.1 * np.sin((wavelength[i1:i2]-500)/100*np.pi)
+    maturity_gain[i1:i2] = 0.12
     
     # 600-700nm: 红光吸收谷
-    mask3 = (wavelength > 600) & (wavelength <= 700)
-    reflectance[mask3] = (0.06 + 0.04 * maturity_level) + 0.03 * np.cos((wavelength[mask3]-600)/100*np.pi)
+    base[i2:i3] = 0.06 + 0.03 * np.cos((wavelength[i2:i3]-600)/100*np.pi)
+    maturity_gain[i2:i3] = 0.04
     
     # 700-1100nm: 近红外高台
-    mask4 = wavelength > 700
-    reflectance[mask4] = (0.35 + 0.2 * maturity_level) + 0.08 * np.sin(wavelength[mask4]/150)
+    base[i3:] = 0.35 + 0.08 * np.sin(wavelength[i3:]/150)
+    maturity_gain[i3:] = 0.2
+    
+    model = tuple(arr.astype(np.float32) for arr in (wavelength, base, maturity_gain))
+    for arr in model:
+        arr.setflags(write=False)
+    return model
+
+def simulate_spectral_data_from_device():
+    """从模拟设备生成光谱数据"""
+    # 每次调用使用独立的生成器，不改动全局随机状态
+    rng = np.random.default_rng()
+    wavelength, base, maturity_gain = _device_spectrum_model()
+    
+    # 模拟不同成熟度的光谱曲线：基线加上按成熟度缩放的增量，整条光谱一次计算
+    maturity_level = float(rng.uniform(0.3, 0.9))  # 成熟度参数
+    reflectance = base + maturity_level * maturity_gain
     
     # 添加设备噪声和测量误差
-    reflectance += 0.02 * np.random.randn(len(wavelength))
-    reflectance = np.clip(reflectance, 0, 1)
+    reflectance += 0.02 * rng.standard_normal(len(wavelength), dtype=np.float32)
+    np.clip(reflectance, 0, 1, out=reflectance)
     
-    # 模拟设备数据格式
+    # 模拟设备数据格式（光谱直接以NumPy数组传递，不转换为Python列表）
     data_packet = {
-        "wavelength": wavelength.tolist(),
-        "reflectance": reflectance.tolist(),
+        "wavelength": wavelength,
+        "reflectance": reflectance,
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "device_id": st.session_state.connected_device["address"] if st.session_state.connected_device else "Unknown",
         "measurement_id": f"MEAS_{int(time.time())}",
-        "temperature": round(random.uniform(25, 35), 1),
-        "humidity": round(random.uniform(50, 80), 1),
-        "signal_strength": random.randint(-40, -60)
+        "temperature": round(float(rng.uniform(25, 35)), 1),
+        "humidity": round(float(rng.uniform(50, 80)), 1),
+        "signal_strength": int(rng.integers(-60, -40, endpoint=True))
     }
     
     return data_packet
@@ -487,7 +1007,7 @@ def connect_to_device(device_info):
         st.session_state.connection_error = None
         
         # 模拟连接过程
-        time.sleep(1.5)  # 模拟连接延迟
+        time.sleep(0.05)  # 模拟连接延迟（仅作示意，避免每次点击都空等）
         
         # 连接成功
         st.session_state.bluetooth_status = "connected"
@@ -507,7 +1027,7 @@ def disconnect_bluetooth():
     st.session_state.connected_device = None
     st.session_state.is_receiving_data = False
     st.session_state.received_data = []
-    st.session_state.data_buffer = []
+    st.session_state.data_buffer.clear()
 
 def start_data_stream():
     """开始接收数据流"""
@@ -520,12 +1040,36 @@ def stop_data_stream():
     """停止接收数据流"""
     st.session_state.is_receiving_data = False
 
+def compute_data_stats(data):
+    """计算波长与反射率的取值范围"""
+    wavelength = data['Wavelength'].to_numpy()
+    reflectance = data['Reflectance'].to_numpy()
+    # 上传文件中可能有空白单元格，取值范围忽略NaN（与pandas的min/max一致）
+    return {
+        'wl_min': float(np.nanmin(wavelength)),
+        'wl_max': float(np.nanmax(wavelength)),
+        'r_min': float(np.nanmin(reflectance)),
+        'r_max': float(np.nanmax(reflectance))
+    }
+
+def set_uploaded_data(data, upload_time, source_id=None):
+    """保存待分析数据，并一次性缓存其取值范围供滑块、预览等复用
+    
+    source_id标识数据来源（上传文件的file_id），用于判断同一文件是否已登记。
+    """
+    st.session_state.uploaded_data = data
+    st.session_state.data_source_id = source_id
+    st.session_state.upload_time = upload_time
+    st.session_state.data_stats = compute_data_stats(data)
+    st.session_state.spectral_arrays = to_spectral_arrays(data)
+    st.session_state.spectral_indices = {}
+
 def process_received_data(data_packet):
     """处理接收到的数据包"""
     try:
-        # 解析数据包
-        wavelength = np.array(data_packet["wavelength"])
-        reflectance = np.array(data_packet["reflectance"])
+        # 解析数据包（已是数组时不复制，列表形式的数据包同样兼容）
+        wavelength = np.asarray(data_packet["wavelength"])
+        reflectance = np.asarray(data_packet["reflectance"])
         
         # 创建DataFrame
         data = pd.DataFrame({
@@ -534,8 +1078,7 @@ def process_received_data(data_packet):
         })
         
         # 保存到session state
-        st.session_state.uploaded_data = data
-        st.session_state.upload_time = data_packet["timestamp"]
+        set_uploaded_data(data, data_packet["timestamp"])
         
         # 添加到数据缓冲区
         st.session_state.data_buffer.append(data_packet)
@@ -546,6 +1089,7 @@ def process_received_data(data_packet):
         return None
 
 # ==================== 页面组件 ====================
+@st.fragment
 def login_page():
     """登录页面"""
     st.markdown('<h1 class="main-header">棉铃成熟度智能检测系统</h1>', unsafe_allow_html=True)
@@ -598,12 +1142,13 @@ def login_page():
         </div>
         """, unsafe_allow_html=True)
 
+@st.fragment
 def dashboard_page():
     """仪表盘页面"""
     # 顶部导航栏
     col_nav1, col_nav2, col_nav3, col_nav4, col_nav5 = st.columns([3, 1, 1, 1, 1])
     with col_nav1:
-        st.markdown(f'<h2 style="color: #2E8B57;">👋 欢迎, {st.session_state.user_name}</h2>', unsafe_allow_html=True)
+        st.markdown(f'<h2 style="color: #2E8B57;">👋 欢迎, {escape(st.session_state.user_name)}</h2>', unsafe_allow_html=True)
     with col_nav2:
         if st.button("📱 蓝牙连接", use_container_width=True):
             st.session_state.current_page = "bluetooth"
@@ -627,53 +1172,15 @@ def dashboard_page():
     # 系统概览卡片（添加蓝牙状态）
     st.subheader("📈 系统概览")
     
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.markdown("""
-        <div class="metric-card">
-            <h3>🎯</h3>
-            <h2>98.5%</h2>
-            <p>检测准确率</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown("""
-        <div class="metric-card">
-            <h3>📊</h3>
-            <h2>1,247</h2>
-            <p>累计分析次数</p>
-        </div>
-        """, unsafe_allow_html=True)
+    # 显示蓝牙连接状态
+    if st.session_state.connected_device:
+        device_name = st.session_state.connected_device['name']
+        bluetooth_card = _BT_CONNECTED_CARD_TMPL.format(device_name=escape(device_name[:15]))
+    else:
+        bluetooth_card = _BT_DISCONNECTED_CARD
     
-    with col3:
-        st.markdown("""
-        <div class="metric-card">
-            <h3>⏱️</h3>
-            <h2>2.3s</h2>
-            <p>平均分析时间</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col4:
-        # 显示蓝牙连接状态
-        if st.session_state.connected_device:
-            device_name = st.session_state.connected_device['name']
-            st.markdown(f"""
-            <div class="metric-card" style="background: linear-gradient(135deg, #00b09b 0%, #96c93d 100%);">
-                <h3>📱</h3>
-                <h4 style="margin: 0.5rem 0;">已连接</h4>
-                <p style="font-size: 0.9rem; margin: 0;">{device_name[:15]}...</p>
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.markdown("""
-            <div class="metric-card" style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);">
-                <h3>📱</h3>
-                <h2>蓝牙</h2>
-                <p>设备未连接</p>
-            </div>
-            """, unsafe_allow_html=True)
+    # 四张卡片拼接为一个HTML块，一次输出
+    st.html(f'<div class="metric-grid">{_STATIC_METRIC_CARDS}{bluetooth_card}</div>')
     
     # 快速开始卡片（添加蓝牙快速入口）
     st.markdown("<br>", unsafe_allow_html=True)
@@ -710,23 +1217,21 @@ def dashboard_page():
                 """)
     
     with col_start4:
-        if st.button("📥 下载示例数据", use_container_width=True):
-            sample_data = generate_sample_data()
-            csv = sample_data.to_csv(index=False)
-            st.download_button(
-                label="点击下载示例数据",
-                data=csv,
-                file_name="sample_spectral_data.csv",
-                mime="text/csv",
-                use_container_width=True
-            )
+        # 示例CSV已预先编码为字节，直接提供下载，无需先点按钮触发一次rerun
+        st.download_button(
+            label="📥 下载示例数据",
+            data=_sample_bundle()[1],
+            file_name="sample_spectral_data.csv",
+            mime="text/csv",
+            use_container_width=True
+        )
     
     # 最新分析记录
     st.markdown("<br>", unsafe_allow_html=True)
     st.subheader("🕒 最近分析记录")
     
     if st.session_state.analysis_history:
-        recent_records = st.session_state.analysis_history[-3:][::-1]
+        recent_records = list(islice(reversed(st.session_state.analysis_history), 3))
         
         for i, record in enumerate(recent_records):
             data_source = record.get('data_source', '文件上传')
@@ -751,6 +1256,14 @@ def dashboard_page():
     else:
         st.info("暂无分析记录，开始您的第一次检测吧！")
 
+# 各检测类型的说明文字
+_DETECTION_TYPE_DESCRIPTIONS = {
+    "成熟度": "评估棉铃生长成熟状态，预测最佳采摘时间",
+    "叶绿素": "分析叶绿素含量，评估光合作用效率",
+    "花青素": "检测花青素积累，评估抗氧化能力"
+}
+
+@st.fragment
 def analysis_page():
     """分析页面"""
     # 顶部导航
@@ -788,13 +1301,7 @@ def analysis_page():
             st.rerun()
     
     # 显示当前选择的检测类型描述
-    type_descriptions = {
-        "成熟度": "评估棉铃生长成熟状态，预测最佳采摘时间",
-        "叶绿素": "分析叶绿素含量，评估光合作用效率",
-        "花青素": "检测花青素积累，评估抗氧化能力"
-    }
-    
-    st.info(f"📌 当前选择: **{st.session_state.detection_type}检测** - {type_descriptions[st.session_state.detection_type]}")
+    st.info(f"📌 当前选择: **{st.session_state.detection_type}检测** - {_DETECTION_TYPE_DESCRIPTIONS[st.session_state.detection_type]}")
     
     # 步骤2: 数据来源选择（修改为三个选项卡）
     st.subheader("📤 选择数据来源")
@@ -813,8 +1320,14 @@ def analysis_page():
             with st.spinner("正在加载数据..."):
                 data = load_spectral_data(uploaded_file)
                 if data is not None and not data.empty:
-                    st.session_state.uploaded_data = data
-                    st.session_state.upload_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    # 同一文件只在首次加载时登记（上传时间、取值范围等），之后的rerun不再重复处理
+                    if st.session_state.data_source_id != uploaded_file.file_id:
+                        set_uploaded_data(
+                            data,
+                            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                            source_id=uploaded_file.file_id
+                        )
+                    stats = st.session_state.data_stats
                     st.success(f"✅ 数据加载成功！共 {len(data)} 个数据点")
                     
                     # 显示数据预览
@@ -822,9 +1335,9 @@ def analysis_page():
                         st.dataframe(data.head(10), use_container_width=True)
                         col_info1, col_info2 = st.columns(2)
                         with col_info1:
-                            st.metric("波长范围", f"{data['Wavelength'].min():.1f} - {data['Wavelength'].max():.1f} nm")
+                            st.metric("波长范围", f"{stats['wl_min']:.1f} - {stats['wl_max']:.1f} nm")
                         with col_info2:
-                            st.metric("反射率范围", f"{data['Reflectance'].min():.3f} - {data['Reflectance'].max():.3f}")
+                            st.metric("反射率范围", f"{stats['r_min']:.3f} - {stats['r_max']:.3f}")
                 elif data is not None and data.empty:
                     st.error("上传的文件为空，请重新上传！")
                 else:
@@ -835,13 +1348,12 @@ def analysis_page():
         if st.button("生成示例光谱数据", use_container_width=True):
             with st.spinner("正在生成示例数据..."):
                 sample_data = generate_sample_data()
-                st.session_state.uploaded_data = sample_data
-                st.session_state.upload_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                set_uploaded_data(sample_data, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
                 st.success("✅ 示例数据已生成！")
                 
                 # 显示示例数据图表
-                fig = create_spectral_plot(sample_data, "示例光谱数据")
-                st.plotly_chart(fig, use_container_width=True)
+                fig = create_spectral_plot(sample_data, "示例光谱数据", cache_key="sample_spectral")
+                st.plotly_chart(fig, use_container_width=True, key="sample_spectral_chart")
     
     # 选项卡3: 蓝牙连接（新增）
     with tab3:
@@ -890,10 +1402,17 @@ def analysis_page():
     
     # 步骤3: 参数设置（如果有数据）
     if is_dataframe_valid(st.session_state.uploaded_data):
-        data = st.session_state.uploaded_data
-        min_wl = int(data['Wavelength'].min())
-        max_wl = int(data['Wavelength'].max())
-        
+        _analysis_workspace(st.session_state.uploaded_data)
+
+@st.fragment
+def _analysis_workspace(data):
+    """参数设置与分析区域（独立片段，拖动滑块或点击分析时不重跑上方的上传与类型选择）"""
+    stats = st.session_state.data_stats or compute_data_stats(data)
+    min_wl = int(stats['wl_min'])
+    max_wl = int(stats['wl_max'])
+    
+    # 参数放在表单中，拖动滑块的过程不触发rerun，点击应用后才重新筛选和绘图
+    with st.form("analysis_params_form", border=False):
         col_param1, col_param2 = st.columns(2)
         
         with col_param1:
@@ -904,7 +1423,6 @@ def analysis_page():
                 value=[max(min_wl, 400), min(max_wl, 1000)],
                 help="选择感兴趣的光谱波段进行分析"
             )
-            st.session_state.selected_wavelength = wavelength_range
         
         with col_param2:
             smoothing = st.select_slider(
@@ -914,132 +1432,233 @@ def analysis_page():
                 help="减少噪声干扰，提高分析精度"
             )
         
-        # 实时显示筛选后的光谱图
-        filtered_data = data[
-            (data['Wavelength'] >= wavelength_range[0]) & 
-            (data['Wavelength'] <= wavelength_range[1])
-        ]
+        st.form_submit_button("应用参数")
+    st.session_state.selected_wavelength = wavelength_range
+    
+    # 实时显示筛选后的光谱图
+    # 数据与波长范围都未变时（如其他控件引起的rerun）沿用上次的筛选结果，
+    # 保持同一对象，光谱图与CSV导出的会话缓存也随之命中
+    view = st.session_state.filtered_view
+    if view is not None and view[0] is data and view[1] == wavelength_range:
+        filtered_data = view[2]
+    else:
+        filtered_data = filter_wavelength_range(data, wavelength_range[0], wavelength_range[1])
+        st.session_state.filtered_view = (data, wavelength_range, filtered_data)
+    
+    if len(filtered_data) > 0:
+        fig = create_spectral_plot(
+            filtered_data,
+            f"筛选后的光谱数据 ({wavelength_range[0]}-{wavelength_range[1]}nm)",
+            cache_key="filtered_spectral"
+        )
+        # 拖动滑块时频繁重绘，隐藏工具栏减少前端挂载开销
+        st.plotly_chart(
+            fig,
+            use_container_width=True,
+            key="filtered_spectral_chart",
+            config={'displayModeBar': False}
+        )
         
-        if len(filtered_data) > 0:
-            fig = create_spectral_plot(filtered_data, f"筛选后的光谱数据 ({wavelength_range[0]}-{wavelength_range[1]}nm)")
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # 保存筛选后的数据
-            st.session_state.filtered_data = filtered_data
-            
-            # 步骤4: 开始分析
-            st.subheader("🚀 开始分析")
-            
-            col_analyze1, col_analyze2 = st.columns([1, 2])
-            with col_analyze1:
-                analyze_btn = st.button("开始分析 🔍", use_container_width=True, type="primary")
-            
-            with col_analyze2:
-                data_source = "蓝牙设备" if st.session_state.connected_device else "上传文件"
-                st.markdown(f"""
-                <div style="background: #f0f7ff; padding: 1rem; border-radius: 10px; border-left: 4px solid #2E8B57;">
-                    <b>分析信息:</b><br>
-                    • 数据来源: {data_source}<br>
-                    • 数据点数: {len(filtered_data)}<br>
-                    • 波长范围: {wavelength_range[0]}-{wavelength_range[1]} nm<br>
-                    • 系统会自动保存本次分析记录
-                </div>
-                """, unsafe_allow_html=True)
+        # 保存筛选后的数据
+        st.session_state.filtered_data = filtered_data
+        
+        # 步骤4: 开始分析
+        st.subheader("🚀 开始分析")
+        
+        col_analyze1, col_analyze2 = st.columns([1, 2])
+        with col_analyze1:
+            analyze_btn = st.button("开始分析 🔍", use_container_width=True, type="primary")
+        
+        with col_analyze2:
+            data_source = "蓝牙设备" if st.session_state.connected_device else "上传文件"
+            st.markdown(f"""
+            <div style="background: #f0f7ff; padding: 1rem; border-radius: 10px; border-left: 4px solid #2E8B57;">
+                <b>分析信息:</b><br>
+                • 数据来源: {data_source}<br>
+                • 数据点数: {len(filtered_data)}<br>
+                • 波长范围: {wavelength_range[0]}-{wavelength_range[1]} nm<br>
+                • 系统会自动保存本次分析记录
+            </div>
+            """, unsafe_allow_html=True)
+        
+        # 如果点击了开始分析按钮
+        if analyze_btn:
+            with st.spinner("正在分析光谱数据..."):
+                # 执行分析（计算本身很快，不再逐步推送模拟进度）
+                # 在入库时转换好的连续数组上按波长范围取指数，切换检测类型时复用已算结果
+                arrays = st.session_state.spectral_arrays or to_spectral_arrays(data)
+                indices = get_spectral_indices(arrays, wavelength_range[0], wavelength_range[1])
+                result = score_spectral_features(*indices, st.session_state.detection_type) if indices else None
             
-            # 如果点击了开始分析按钮
-            if analyze_btn:
-                with st.spinner("正在分析光谱数据..."):
-                    # 模拟分析过程
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-                    
-                    for i in range(100):
-                        progress_bar.progress(i + 1)
-                        if i < 30:
-                            status_text.text("数据预处理中...")
-                        elif i < 70:
-                            status_text.text("计算光谱指数...")
-                        else:
-                            status_text.text("生成检测结果...")
-                    
-                    # 执行分析
-                    result = analyze_spectral_data(filtered_data, st.session_state.detection_type)
-                    
-                    if result:
-                        result['time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        result['data_source'] = data_source
-                        if st.session_state.connected_device:
-                            result['device_info'] = st.session_state.connected_device
-                        
-                        st.session_state.detection_result = result
-                        st.session_state.analysis_history.append(result)
-                        st.session_state.analysis_completed = True
-                        st.session_state.just_analyzed = True
-                        
-                        st.success("✅ 分析完成！")
-                        
-                        # 显示简要结果
-                        with st.expander("查看简要结果", expanded=True):
-                            if result['type'] == '成熟度':
-                                st.metric("成熟度", f"{result['score']}%")
-                                st.metric("单铃重", f"{result.get('boll_weight', 0)} g")
-                                st.write(f"**建议:** {result['recommendation']}")
-                            elif result['type'] == '叶绿素':
-                                st.metric("总叶绿素", f"{result['total']} mg/g")
-                                st.metric("状态", result['status'])
-                            else:
-                                st.metric("花青素含量", f"{result['content']} mg/g")
-                                st.metric("抗氧化能力", result['antioxidant'])
-                        
-                        # 在"分析提示"下方横向排列两个按钮
-                        st.markdown("<br>", unsafe_allow_html=True)
-                        col_btn1, col_btn2 = st.columns(2)
-                        
-                        with col_btn1:
-                            if st.button("📊 查看详细结果", use_container_width=True, type="primary"):
-                                st.session_state.current_page = "result"
-                                st.rerun()
-                        
-                        with col_btn2:
-                            if st.button("🔄 重新分析", use_container_width=True, type="secondary"):
-                                st.session_state.analysis_completed = False
-                                st.session_state.detection_result = None
-                                st.session_state.just_analyzed = False
-                                st.rerun()
-                    else:
-                        st.error("分析失败，请检查数据格式")
-            elif st.session_state.just_analyzed and st.session_state.analysis_completed:
-                # 如果是刚刚分析完成，显示结果和按钮
-                result = st.session_state.detection_result
-                if result:
-                    # 显示简要结果
-                    with st.expander("查看简要结果", expanded=True):
-                        if result['type'] == '成熟度':
-                            st.metric("成熟度", f"{result['score']}%")
-                            st.metric("单铃重", f"{result.get('boll_weight', 0)} g")
-                            st.write(f"**建议:** {result['recommendation']}")
-                        elif result['type'] == '叶绿素':
-                            st.metric("总叶绿素", f"{result['total']} mg/g")
-                            st.metric("状态", result['status'])
-                        else:
-                            st.metric("花青素含量", f"{result['content']} mg/g")
-                            st.metric("抗氧化能力", result['antioxidant'])
-                    
-                    st.markdown("<br>", unsafe_allow_html=True)
-                    col_btn1, col_btn2 = st.columns(2)
-                    
-                    with col_btn1:
-                        if st.button("📊 查看详细结果", use_container_width=True, type="primary"):
-                            st.session_state.current_page = "result"
-                            st.rerun()
-                    
-                    with col_btn2:
-                        if st.button("🔄 重新分析", use_container_width=True, type="secondary"):
-                            st.session_state.analysis_completed = False
-                            st.session_state.detection_result = None
-                            st.session_state.just_analyzed = False
-                            st.rerun()
+            if result:
+                result['time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                result['data_source'] = data_source
+                if st.session_state.connected_device:
+                    result['device_info'] = st.session_state.connected_device
+                
+                st.session_state.detection_result = result
+                append_history(result)
+                st.session_state.analysis_completed = True
+                st.session_state.just_analyzed = True
+                
+                st.success("✅ 分析完成！")
+            else:
+                st.error("分析失败，请检查数据格式")
+        
+        # 刚刚分析完成时，显示结果和按钮
+        if st.session_state.just_analyzed and st.session_state.analysis_completed and st.session_state.detection_result:
+            _render_result_summary(st.session_state.detection_result)
+
+def render_maturity_brief(result):
+    """显示成熟度检测的简要结果"""
+    st.metric("成熟度", f"{result['score']}%")
+    st.metric("单铃重", f"{result.get('boll_weight', 0)} g")
+    st.write(f"**建议:** {result['recommendation']}")
+
+def render_chlorophyll_brief(result):
+    """显示叶绿素检测的简要结果"""
+    st.metric("总叶绿素", f"{result['total']} mg/g")
+    st.metric("状态", result['status'])
+
+def render_anthocyanin_brief(result):
+    """显示花青素检测的简要结果"""
+    st.metric("花青素含量", f"{result['content']} mg/g")
+    st.metric("抗氧化能力", result['antioxidant'])
+
+# 检测类型到简要结果渲染函数的分派表（未知类型按花青素显示）
+_BRIEF_RENDERERS = {
+    "成熟度": render_maturity_brief,
+    "叶绿素": render_chlorophyll_brief,
+    "花青素": render_anthocyanin_brief
+}
+
+def _render_result_summary(result):
+    """显示简要分析结果及"查看详细结果/重新分析"按钮"""
+    # 显示简要结果
+    with st.expander("查看简要结果", expanded=True):
+        _BRIEF_RENDERERS.get(result['type'], render_anthocyanin_brief)(result)
+    
+    # 在"分析提示"下方横向排列两个按钮
+    st.markdown("<br>", unsafe_allow_html=True)
+    col_btn1, col_btn2 = st.columns(2)
+    
+    with col_btn1:
+        if st.button("📊 查看详细结果", use_container_width=True, type="primary"):
+            st.session_state.current_page = "result"
+            st.rerun()
+    
+    with col_btn2:
+        if st.button("🔄 重新分析", use_container_width=True, type="secondary"):
+            st.session_state.analysis_completed = False
+            st.session_state.detection_result = None
+            st.session_state.just_analyzed = False
+            st.rerun()
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def build_result_card_html(result):
+    """生成结果页的指标卡片HTML（按结果缓存，结果不变时rerun直接复用）"""
+    safe_result = escape_html_fields(result)
+    if result['type'] == "成熟度":
+        status_color = _MATURITY_STATUS_COLORS.get(result.get('maturity_status'), '#2E8B57')
+        return _MATURITY_RESULT_TMPL.format(status_color=status_color, **safe_result)
+    if result['type'] == "叶绿素":
+        status_color = _CHLOROPHYLL_STATUS_COLORS.get(result['status'], "#666")
+        return _CHLOROPHYLL_RESULT_TMPL.format(status_color=status_color, **safe_result)
+    antioxidant_color = _ANTIOXIDANT_COLORS.get(result['antioxidant'], "#666")
+    return _ANTHOCYANIN_RESULT_TMPL.format(antioxidant_color=antioxidant_color, **safe_result)
+
+def render_maturity_result(result, card_html):
+    """显示成熟度检测的仪表盘、详细指标与生产建议"""
+    col_result1, col_result2 = st.columns([1, 2])
+    
+    with col_result1:
+        # 使用修改后的成熟度仪表盘
+        fig = create_maturity_gauge(result['score'], "成熟度")
+        st.plotly_chart(fig, use_container_width=True, key="maturity_gauge_chart")
+    
+    with col_result2:
+        # 详细指标与生产建议两张卡片合并为一次渲染
+        st.html(card_html)
+
+def render_chlorophyll_result(result, card_html):
+    """显示叶绿素检测的组分柱状图与分析结果"""
+    col_result1, col_result2 = st.columns(2)
+    
+    with col_result1:
+        # 柱状图显示叶绿素组分
+        fig = create_chlorophyll_bar(float(result['chlorophyll_a']), float(result['chlorophyll_b']))
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col_result2:
+        st.html(card_html)
+
+def render_anthocyanin_result(result, card_html):
+    """显示花青素检测的积累阶段仪表盘与分析结果"""
+    col_result1, col_result2 = st.columns(2)
+    
+    with col_result1:
+        # 创建花青素含量指示器
+        fig = create_result_gauge(
+            _ACCUMULATION_STAGE_LEVELS.get(result['accumulation_stage'], 50),
+            "积累阶段",
+            100
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col_result2:
+        st.html(card_html)
+
+# 检测类型到结果渲染函数的分派表（未知类型按花青素显示，与原先的else分支一致）
+_RESULT_RENDERERS = {
+    "成熟度": render_maturity_result,
+    "叶绿素": render_chlorophyll_result,
+    "花青素": render_anthocyanin_result
+}
 
+@st.cache_data(show_spinner=False, max_entries=64)
+def build_report_bytes(result, user_name):
+    """生成检测报告正文（UTF-8字节，不含生成时间），按结果和用户缓存"""
+    report_text = f"""棉铃成熟度检测报告
+=================
+
+检测类型: {result['type']}
+检测时间: {result.get('time', 'N/A')}
+分析用户: {user_name}
+置信度: {result['confidence']}%
+
+主要结果:
+"""
+    
+    if result['type'] == '成熟度':
+        report_text += f"""
+• 成熟度指数: {result['score']}%
+• 成熟状态: {result.get('maturity_status', 'N/A')}
+• 单铃重: {result.get('boll_weight', 'N/A')} g
+• 纤维品质: {result.get('fiber_quality', 'N/A')}
+• 建议: {result['recommendation']}
+"""
+    elif result['type'] == '叶绿素':
+        report_text += f"""
+• 总叶绿素: {result['total']} mg/g
+• 叶绿素a: {result['chlorophyll_a']} mg/g
+• 叶绿素b: {result['chlorophyll_b']} mg/g
+• 状态: {result['status']}
+"""
+    else:
+        report_text += f"""
+• 花青素含量: {result['content']} mg/g
+• 积累阶段: {result['accumulation_stage']}
+• 抗氧化能力: {result['antioxidant']}
+"""
+    
+    report_text += """
+
+分析系统: 棉铃成熟度智能检测系统 v2.0
+"""
+    
+    return report_text.encode('utf-8')
+
+@st.fragment
 def result_page():
     """结果展示页面"""
     if not st.session_state.detection_result:
@@ -1082,204 +1701,54 @@ def result_page():
     # 主要结果展示
     st.subheader("📋 主要检测结果")
     
-    if result['type'] == '成熟度':
-        col_result1, col_result2, col_result3 = st.columns(3)
-        
-        with col_result1:
-            # 使用修改后的成熟度仪表盘
-            fig = create_maturity_gauge(result['score'], "成熟度")
-            st.plotly_chart(fig, use_container_width=True)
-        
-        with col_result2:
-            st.markdown(f"""
-            <div style="background: white; padding: 2rem; border-radius: 15px; box-shadow: 0 5px 15px rgba(0,0,0,0.05); height: 300px;">
-                <h4 style="color: #2E8B57;">📊 详细指标</h4>
-                <table style="width: 100%; margin-top: 1rem; font-size: 16px;">
-                    <tr style="height: 50px;">
-                        <td style="width: 40%;"><b>单铃重:</b></td>
-                        <td style="width: 60%;">{result.get('boll_weight', 'N/A')} g</td>
-                    </tr>
-                    <tr style="height: 50px;">
-                        <td><b>纤维品质:</b></td>
-                        <td>
-                            <span style="color: #2E8B57; font-weight: bold;">
-                                {result.get('fiber_quality', 'N/A')}
-                            </span>
-                        </td>
-                    </tr>
-                    <tr style="height: 50px;">
-                        <td><b>成熟状态:</b></td>
-                        <td>
-                            <span style="color: {'#FF6B6B' if result.get('maturity_status') == '成熟' else '#2E8B57'}; font-weight: bold;">
-                                {result.get('maturity_status', 'N/A')}
-                            </span>
-                        </td>
-                    </tr>
-                </table>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col_result3:
-            st.markdown(f"""
-            <div style="background: white; padding: 2rem; border-radius: 15px; box-shadow: 0 5px 15px rgba(0,0,0,0.05); height: 300px;">
-                <h4 style="color: #2E8B57;">💡 生产建议</h4>
-                <div style="margin-top: 1rem; padding: 1rem; background: #f8f9fa; border-radius: 10px;">
-                    <p>{result['recommendation']}</p>
-                </div>
-                <div style="margin-top: 1rem;">
-                    <small>基于光谱指数分析，结合历史数据模型得出</small>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-    
-    elif result['type'] == '叶绿素':
-        col_result1, col_result2 = st.columns(2)
-        
-        with col_result1:
-            # 柱状图显示叶绿素组分
-            fig = go.Figure(data=[
-                go.Bar(name='叶绿素a', x=['含量'], y=[result['chlorophyll_a']], marker_color='#2E8B57'),
-                go.Bar(name='叶绿素b', x=['含量'], y=[result['chlorophyll_b']], marker_color='#90EE90')
-            ])
-            fig.update_layout(
-                title="叶绿素组分分析",
-                barmode='group',
-                height=400,
-                showlegend=True
-            )
-            st.plotly_chart(fig, use_container_width=True)
-        
-        with col_result2:
-            status_color = {
-                "正常": "#2E8B57",
-                "偏高": "#FFA500",
-                "偏低": "#FF6B6B"
-            }.get(result['status'], "#666")
-            
-            st.markdown(f"""
-            <div style="background: white; padding: 2rem; border-radius: 15px; box-shadow: 0 5px 15px rgba(0,0,0,0.05);">
-                <h4 style="color: {status_color};">📈 分析结果</h4>
-                <div style="margin-top: 1rem; padding: 1rem; background: #f8f9fa; border-radius: 10px;">
-                    <p><b>总叶绿素含量:</b> {result['total']} mg/g</p>
-                    <p><b>叶绿素a:</b> {result['chlorophyll_a']} mg/g</p>
-                    <p><b>叶绿素b:</b> {result['chlorophyll_b']} mg/g</p>
-                    <p><b>叶绿素a/b比值:</b> {(result['chlorophyll_a']/result['chlorophyll_b']):.2f}</p>
-                </div>
-                <div style="margin-top: 1rem; padding: 1rem; background: #e8f4f8; border-radius: 10px;">
-                    <small>💡 正常范围: 2.0-3.0 mg/g | 当前状态: <b>{result['status']}</b></small>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-    
-    else:  # 花青素
-        col_result1, col_result2 = st.columns(2)
-        
-        with col_result1:
-            # 创建花青素含量指示器
-            stages = {
-                "初期": 25,
-                "中期成熟": 60,
-                "完全成熟": 95
-            }
-            
-            fig = create_result_gauge(
-                stages.get(result['accumulation_stage'], 50),
-                "积累阶段",
-                100
-            )
-            st.plotly_chart(fig, use_container_width=True)
-        
-        with col_result2:
-            antioxidant_color = {
-                "强": "#2E8B57",
-                "中": "#FFA500",
-                "弱": "#FF6B6B"
-            }.get(result['antioxidant'], "#666")
-            
-            st.markdown(f"""
-            <div style="background: white; padding: 2rem; border-radius: 15px; box-shadow: 0 5px 15px rgba(0,0,0,0.05);">
-                <h4 style="color: #8A2BE2;">🌸 花青素分析</h4>
-                <div style="margin-top: 1rem; padding: 1rem; background: #f8f9fa; border-radius: 10px;">
-                    <p><b>含量:</b> {result['content']} mg/g</p>
-                    <p><b>积累阶段:</b> {result['accumulation_stage']}</p>
-                    <p><b>抗氧化能力:</b> <span style="color: {antioxidant_color}">{result['antioxidant']}</span></p>
-                </div>
-                <div style="margin-top: 1rem; padding: 1rem; background: #f5f0ff; border-radius: 10px;">
-                    <small>💡 花青素含量与棉铃成熟度、抗逆性密切相关</small>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+    # 指标卡片HTML按结果缓存（转义在其中完成），再交给对应类型的渲染函数
+    card_html = build_result_card_html(result)
+    _RESULT_RENDERERS.get(result['type'], render_anthocyanin_result)(result, card_html)
     
     # 光谱曲线显示
     st.markdown("<br>", unsafe_allow_html=True)
     st.subheader("📈 分析用光谱曲线")
     
     if st.session_state.filtered_data is not None and not st.session_state.filtered_data.empty:
-        fig = create_spectral_plot(st.session_state.filtered_data, "分析光谱数据")
-        st.plotly_chart(fig, use_container_width=True)
+        fig = create_result_spectral_plot(st.session_state.filtered_data)
+        st.plotly_chart(fig, use_container_width=True, key="result_spectral_chart")
     
     # 导出功能
     st.markdown("---")
     st.subheader("💾 数据导出")
     
+    _export_section(result)
+
+@st.fragment
+def _export_section(result):
+    """数据导出区域（独立片段，点击下载或打印时不重跑上方的图表与结果卡片）"""
+    # 文件名与报告中的时间统一取自同一时刻
+    now = datetime.now()
+    file_ts = now.strftime('%Y%m%d_%H%M%S')
+    
     col_export1, col_export2, col_export3 = st.columns(3)
     
     with col_export1:
         if st.session_state.filtered_data is not None and not st.session_state.filtered_data.empty:
-            csv = st.session_state.filtered_data.to_csv(index=False)
+            csv = get_csv_bytes(st.session_state.filtered_data)
             st.download_button(
                 label="📥 下载光谱数据",
                 data=csv,
-                file_name=f"spectral_data_{result['type']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                file_name=f"spectral_data_{result['type']}_{file_ts}.csv",
                 mime="text/csv",
                 use_container_width=True
             )
     
     with col_export2:
-        # 生成报告文本
-        report_text = f"""棉铃成熟度检测报告
-=================
-
-检测类型: {result['type']}
-检测时间: {result.get('time', 'N/A')}
-分析用户: {st.session_state.user_name}
-置信度: {result['confidence']}%
-
-主要结果:
-"""
-        
-        if result['type'] == '成熟度':
-            report_text += f"""
-• 成熟度指数: {result['score']}%
-• 成熟状态: {result.get('maturity_status', 'N/A')}
-• 单铃重: {result.get('boll_weight', 'N/A')} g
-• 纤维品质: {result.get('fiber_quality', 'N/A')}
-• 建议: {result['recommendation']}
-"""
-        elif result['type'] == '叶绿素':
-            report_text += f"""
-• 总叶绿素: {result['total']} mg/g
-• 叶绿素a: {result['chlorophyll_a']} mg/g
-• 叶绿素b: {result['chlorophyll_b']} mg/g
-• 状态: {result['status']}
-"""
-        else:
-            report_text += f"""
-• 花青素含量: {result['content']} mg/g
-• 积累阶段: {result['accumulation_stage']}
-• 抗氧化能力: {result['antioxidant']}
-"""
-        
-        report_text += f"""
-
-分析系统: 棉铃成熟度智能检测系统 v2.0
-生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-"""
+        # 报告正文按结果缓存，只在末尾追加当前的生成时间
+        report_bytes = build_report_bytes(result, st.session_state.user_name) + (
+            f"生成时间: {now.strftime('%Y-%m-%d %H:%M:%S')}\n".encode('utf-8')
+        )
         
         st.download_button(
             label="📄 下载检测报告",
-            data=report_text,
-            file_name=f"detection_report_{result['type']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+            data=report_bytes,
+            file_name=f"detection_report_{result['type']}_{file_ts}.txt",
             mime="text/plain",
             use_container_width=True
         )
@@ -1307,78 +1776,69 @@ def history_page():
             st.rerun()
         return
     
-    # 按时间倒序显示历史记录
-    for i, record in enumerate(reversed(st.session_state.analysis_history)):
-        with st.expander(f"记录 {i+1}: {record['type']}检测 - {record.get('time', '未知时间')}", expanded=(i==0)):
-            col_his1, col_his2, col_his3 = st.columns([2, 1, 1])
-            
-            with col_his1:
-                if record['type'] == '成熟度':
-                    st.markdown(f"""
-                    **成熟度指数:** {record['score']}%  
-                    **成熟状态:** {record.get('maturity_status', 'N/A')}  
-                    **单铃重:** {record.get('boll_weight', 'N/A')} g  
-                    **纤维品质:** {record.get('fiber_quality', 'N/A')}  
-                    **建议:** {record['recommendation']}
-                    """)
-                elif record['type'] == '叶绿素':
-                    st.markdown(f"""
-                    **总叶绿素:** {record['total']} mg/g  
-                    **叶绿素a:** {record['chlorophyll_a']} mg/g  
-                    **叶绿素b:** {record['chlorophyll_b']} mg/g  
-                    **状态:** {record['status']}
-                    """)
-                else:
-                    st.markdown(f"""
-                    **花青素含量:** {record['content']} mg/g  
-                    **积累阶段:** {record['accumulation_stage']}  
-                    **抗氧化能力:** {record['antioxidant']}
-                    """)
-            
-            with col_his2:
-                st.metric("置信度", f"{record['confidence']}%")
-            
-            with col_his3:
-                if st.button(f"查看详情", key=f"view_{i}", use_container_width=True):
-                    st.session_state.detection_result = record
-                    st.session_state.current_page = "result"
-                    st.rerun()
+    # 全部记录合并为一张表格一次渲染（按时间倒序），选中一行即可查看详情
+    history = st.session_state.analysis_history
+    event = st.dataframe(
+        get_history_table(),
+        use_container_width=True,
+        hide_index=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key="history_table_view"
+    )
+    selected_rows = event.selection.rows
+    
+    if st.button("查看详情", disabled=not selected_rows, help="在表格中选中一条记录后查看其详细结果"):
+        st.session_state.detection_result = history[len(history) - 1 - selected_rows[0]]
+        st.session_state.current_page = "result"
+        st.rerun()
     
     # 统计信息
     st.markdown("---")
     st.subheader("📊 统计概览")
     
     if st.session_state.analysis_history:
-        # 转换为DataFrame进行统计
-        history_list = []
-        for record in st.session_state.analysis_history:
-            history_list.append({
-                'type': record['type'],
-                'confidence': record.get('confidence', 0),
-                'time': record.get('time', '')
-            })
+        stats = get_history_stats()
         
-        if history_list:
-            history_df = pd.DataFrame(history_list)
-            
-            col_stat1, col_stat2, col_stat3 = st.columns(3)
-            
-            with col_stat1:
-                st.metric("总分析次数", len(st.session_state.analysis_history))
-            
-            with col_stat2:
-                if 'confidence' in history_df.columns:
-                    avg_confidence = history_df['confidence'].mean()
-                    st.metric("平均置信度", f"{avg_confidence:.1f}%")
-            
-            with col_stat3:
-                if 'type' in history_df.columns:
-                    type_counts = history_df['type'].value_counts()
-                    if not type_counts.empty:
-                        most_common = type_counts.idxmax()
-                        st.metric("最常检测类型", most_common)
-                    else:
-                        st.metric("最常检测类型", "N/A")
+        col_stat1, col_stat2, col_stat3 = st.columns(3)
+        
+        with col_stat1:
+            st.metric("总分析次数", stats['total'])
+        
+        with col_stat2:
+            st.metric("平均置信度", f"{stats['avg_confidence']:.1f}%")
+        
+        with col_stat3:
+            st.metric("最常检测类型", stats['most_common'])
+
+@st.fragment(run_every=0.5)
+def _live_data_stream():
+    """实时数据流（独立片段，每0.5秒只重跑本片段接收一个数据包，不阻塞页面其余部分）"""
+    # 生成模拟数据
+    data_packet = simulate_spectral_data_from_device()
+    data = process_received_data(data_packet)
+    
+    if data is not None:
+        # 显示数据图表
+        fig = create_spectral_plot(data, "实时光谱数据", cache_key="live_spectral")
+        # 实时曲线每0.5秒刷新一次，关闭悬停检测
+        fig.layout.hovermode = False
+        st.plotly_chart(fig, use_container_width=True, key="live_spectral_chart")
+        
+        # 显示数据统计
+        col_stats1, col_stats2, col_stats3 = st.columns(3)
+        with col_stats1:
+            st.metric("数据点数", len(data))
+        with col_stats2:
+            stats = st.session_state.data_stats
+            st.metric("波长范围", f"{stats['wl_min']:.1f} - {stats['wl_max']:.1f} nm")
+        with col_stats3:
+            st.metric("信号强度", f"{data_packet.get('signal_strength', -55)} dBm")
+        
+        # 自动跳转到分析页面的选项
+        if st.button("✅ 使用此数据进行分析", use_container_width=True, type="primary"):
+            st.session_state.current_page = "analysis"
+            st.rerun()
 
 def bluetooth_connection_page():
     """蓝牙连接页面"""
@@ -1438,7 +1898,7 @@ def bluetooth_connection_page():
     
     # 显示已连接的设备信息
     if st.session_state.connected_device:
-        device = st.session_state.connected_device
+        device = escape_html_fields(st.session_state.connected_device)
         st.markdown(f"""
         <div class="custom-card">
             <h4>📡 已连接设备</h4>
@@ -1476,32 +1936,7 @@ def bluetooth_connection_page():
             st.markdown("---")
             st.subheader("📈 实时数据流")
             
-            # 模拟实时数据接收
-            with st.spinner("正在接收光谱数据..."):
-                time.sleep(0.5)  # 模拟传输延迟
-                
-                # 生成模拟数据
-                data_packet = simulate_spectral_data_from_device()
-                data = process_received_data(data_packet)
-                
-                if data is not None:
-                    # 显示数据图表
-                    fig = create_spectral_plot(data, "实时光谱数据")
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    # 显示数据统计
-                    col_stats1, col_stats2, col_stats3 = st.columns(3)
-                    with col_stats1:
-                        st.metric("数据点数", len(data))
-                    with col_stats2:
-                        st.metric("波长范围", f"{data['Wavelength'].min():.1f} - {data['Wavelength'].max():.1f} nm")
-                    with col_stats3:
-                        st.metric("信号强度", f"{data_packet.get('signal_strength', -55)} dBm")
-                    
-                    # 自动跳转到分析页面的选项
-                    if st.button("✅ 使用此数据进行分析", use_container_width=True, type="primary"):
-                        st.session_state.current_page = "analysis"
-                        st.rerun()
+            _live_data_stream()
     
     # 可用设备列表
     if st.session_state.bluetooth_status == "scanning" and st.session_state.available_devices:
@@ -1513,11 +1948,12 @@ def bluetooth_connection_page():
             
             with col_device1:
                 paired_icon = "🔗" if device.get("paired", False) else "🔓"
+                safe_device = escape_html_fields(device)
                 st.markdown(f"""
                 <div class="device-item">
-                    <h4>{paired_icon} {device['name']}</h4>
+                    <h4>{paired_icon} {safe_device['name']}</h4>
                     <p style="margin: 0; font-size: 0.9rem; color: #666;">
-                        地址: {device['address']} | 类型: {device['type']} | 信号: {device['rssi']} dBm
+                        地址: {safe_device['address']} | 类型: {safe_device['type']} | 信号: {safe_device['rssi']} dBm
                     </p>
                 </div>
                 """, unsafe_allow_html=True)
@@ -1582,28 +2018,31 @@ def bluetooth_connection_page():
         """)
 
 # ==================== 主应用 ====================
+# 页面名称到页面函数的路由表
+_PAGES = {
+    "login": login_page,
+    "dashboard": dashboard_page,
+    "analysis": analysis_page,
+    "result": result_page,
+    "history": history_page,
+    "bluetooth": bluetooth_connection_page
+}
+
 def main():
     """主应用入口"""
-    # 初始化session state
-    init_session_state()
+    # 初始化session state（每个会话只需填充一次默认值）
+    if not st.session_state.get('session_initialized'):
+        init_session_state()
+        st.session_state.session_initialized = True
     
     # 检查登录状态
     if not st.session_state.logged_in and st.session_state.current_page != "login":
         st.session_state.current_page = "login"
     
     # 根据当前页面路由显示对应内容
-    pages = {
-        "login": login_page,
-        "dashboard": dashboard_page,
-        "analysis": analysis_page,
-        "result": result_page,
-        "history": history_page,
-        "bluetooth": bluetooth_connection_page
-    }
-    
-    current_page = st.session_state.current_page
-    if current_page in pages:
-        pages[current_page]()
+    page = _PAGES.get(st.session_state.current_page)
+    if page is not None:
+        page()
     else:
         # 默认跳转到登录页面
         st.session_state.current_page = "login"
@@ -0,0 +1,49 @@
+import importlib.util
+import io
+from pathlib import Path
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = Path(__file__).resolve().parent.parent / "spectral_tool_1.py"
+
+
+def _load_app_module():
+    spec = importlib.util.spec_from_file_location("spectral_tool_1", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _analysis_page_with(data, app):
+    at = AppTest.from_file(str(APP_PATH), default_timeout=30)
+    at.session_state["logged_in"] = True
+    at.session_state["current_page"] = "analysis"
+    at.session_state["uploaded_data"] = data
+    at.session_state["data_stats"] = app.compute_data_stats(data)
+    at.session_state["spectral_arrays"] = app.to_spectral_arrays(data)
+    return at.run()
+
+
+def test_analysis_page_renders_csv_with_missing_values():
+    app = _load_app_module()
+    wavelengths = range(400, 1101, 5)
+    rows = [f"{wl},{0.1 + (wl - 400) / 2000:.4f}" for wl in wavelengths]
+    rows[10] = f",{0.2:.4f}"    # 波长缺失
+    rows[20] = "500,"           # 反射率缺失
+    csv = "wavelength,reflectance\n" + "\n".join(rows) + "\n"
+
+    data = app.load_spectral_data(io.BytesIO(csv.encode("utf-8")))
+    stats = app.compute_data_stats(data)
+    assert stats['wl_min'] == 400.0
+    assert stats['wl_max'] == 1100.0
+    assert stats['r_min'] == pytest.approx(0.1)
+    assert stats['r_max'] == pytest.approx(0.45)
+
+    at = _analysis_page_with(data, app)
+    assert not at.exception
+    assert at.slider[0].value == (400, 1000)
+
+    analyze = next(b for b in at.button if b.label.startswith("开始分析"))
+    analyze.click().run()
+    assert not at.exception